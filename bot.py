@@ -1,17 +1,27 @@
 import os
 import re
-import uuid
+import json
+import string
+import secrets
+import time
+import signal
 import logging
 import asyncio
+import contextlib
 import asyncpg
 from telegram import (
     Update,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
+    InputMediaAudio,
+    InputMediaDocument,
+    InputMediaPhoto,
+    InputMediaVideo,
     Message,
     ReplyKeyboardMarkup
 )
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CommandHandler,
     MessageHandler,
@@ -20,10 +30,23 @@ from telegram.ext import (
     filters,
     ConversationHandler
 )
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
 from dotenv import load_dotenv
 from aiohttp import web
 import aiohttp
 
+try:
+    import uvloop
+except ImportError:  # uvloop روی ویندوز در دسترس نیست
+    uvloop = None
+
+try:
+    import orjson  # تجزیه سریع‌تر بدنه Webhook و ستون‌های JSON دیتابیس
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 # تنظیمات محیطی
 load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
@@ -31,11 +54,31 @@ ADMIN_IDS = [int(id) for id in os.getenv('ADMIN_IDS', '').split(',') if id]
 WEBHOOK_URL = os.getenv('WEBHOOK_URL')
 WEBHOOK_PATH = f"/{BOT_TOKEN}"
 PORT = int(os.getenv('PORT', 8080))
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', 8))  # تعداد پردازشگرهای پس‌زمینه آپدیت‌ها
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', 1000))  # ظرفیت صف هر پردازشگر
+KEEP_ALIVE_INTERVAL = 300  # فاصله پینگ health endpoint (ثانیه)
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', 100))  # سقف اتصال‌های نشست HTTP مشترک سرور وب
+
+# تنظیمات اتصال HTTP به Bot API (HTTP/2 برای اشتراک یک اتصال بین درخواست‌های همزمان)
+BOT_API_HTTP_VERSION = os.getenv('BOT_API_HTTP_VERSION', '2')
+BOT_API_POOL_SIZE = int(os.getenv('BOT_API_POOL_SIZE', 256))
+# مهلت طولانی‌تر فقط برای ارسال فایل‌ها (آلبوم‌ها پاسخ کندتری دارند)؛
+# سایر درخواست‌ها، از جمله بررسی عضویت، مهلت پیش‌فرض کوتاه را نگه می‌دارند
+FILE_SEND_READ_TIMEOUT = float(os.getenv('FILE_SEND_READ_TIMEOUT', 30))
+FILE_SEND_WRITE_TIMEOUT = float(os.getenv('FILE_SEND_WRITE_TIMEOUT', 30))
 
-# تنظیمات لاگ
+# تنظیمات استخر اتصال دیتابیس
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 5))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 20))
+DB_MAX_INACTIVE_LIFETIME = float(os.getenv('DB_MAX_INACTIVE_LIFETIME', 300))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 1024))
+DB_MAX_CACHED_STATEMENT_LIFETIME = float(os.getenv('DB_MAX_CACHED_STATEMENT_LIFETIME', 0))  # 0 = بدون انقضا
+DB_COMMAND_TIMEOUT = float(os.getenv('DB_COMMAND_TIMEOUT', 10))  # فقط کوئری‌های زمان پاسخ، نه مهاجرت‌ها
+
+# تنظیمات لاگ (قالب‌بندی پیام‌ها فقط برای رکوردهای ثبت‌شدنی انجام می‌شود)
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+    level=os.getenv('LOG_LEVEL', 'INFO').upper()
 )
 logger = logging.getLogger(__name__)
 
@@ -50,32 +93,228 @@ MAIN_MENU = ReplyKeyboardMarkup(
     input_field_placeholder="لطفا یک گزینه را انتخاب کنید"
 )
 
+# دکمه بازگشت در گفتگوهای متنی
+BACK_BUTTON_TEXT = "↩️ بازگشت به منوی اصلی"
+
 BACK_MENU = ReplyKeyboardMarkup(
-    [["↩️ بازگشت به منوی اصلی"]],
+    [[BACK_BUTTON_TEXT]],
     resize_keyboard=True
 )
 
+# نسخه JSON کیبوردهای ثابت یکبار ساخته می‌شود؛
+# کتابخانه رشته‌ها را بدون سریال‌سازی مجدد ارسال می‌کند
+MAIN_MENU_JSON = MAIN_MENU.to_json()
+BACK_MENU_JSON = BACK_MENU.to_json()
+
+# کیبوردهای شیشه‌ای ثابت (بدون وابستگی به کاربر یا دسته)
+CHANNEL_MANAGEMENT_MENU_JSON = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ اضافه کردن کانال", callback_data="add_channel")],
+    [InlineKeyboardButton("➖ حذف کانال", callback_data="remove_channel")],
+    [InlineKeyboardButton("👁️ مشاهده کانال‌ها", callback_data="list_channels")]
+]).to_json()
+
+ADMIN_MANAGEMENT_MENU_JSON = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ افزودن ادمین", callback_data="add_admin")],
+    [InlineKeyboardButton("➖ حذف ادمین", callback_data="remove_admin")],
+    [InlineKeyboardButton("👥 لیست ادمین‌ها", callback_data="list_admins")]
+]).to_json()
+
+POST_TYPE_ROWS = (
+    (InlineKeyboardButton("📝 متن", callback_data="post_text"),),
+    (InlineKeyboardButton("🖼 عکس", callback_data="post_photo"),),
+    (InlineKeyboardButton("🎥 ویدیو", callback_data="post_video"),),
+    (InlineKeyboardButton("📄 سند", callback_data="post_document"),)
+)
+POST_TYPE_MENU_JSON = InlineKeyboardMarkup(POST_TYPE_ROWS).to_json()
+POST_MESSAGE_MENU_JSON = InlineKeyboardMarkup(POST_TYPE_ROWS + (
+    (InlineKeyboardButton("🌐 پیام سراسری", callback_data="global_post"),),
+    (InlineKeyboardButton("🗑 حذف پیام", callback_data="del_post"),)
+)).to_json()
+
+# کلیدهای داده‌های موقت کاربر که با لغو عملیات پاک می‌شوند
+TEMP_USER_DATA_KEYS = ('upload', 'channel_id', 'channel_name', 'post_message', 'admin_action')
+
 # حالت‌های گفتگو
 (
     UPLOADING, WAITING_CHANNEL_INFO, AWAITING_CATEGORY_NAME,
     POST_MESSAGE_SETUP, AWAITING_POST_MESSAGE, AWAITING_ADMIN_ID,
-    TIMER_SETTINGS
-) = range(7)
+    TIMER_SETTINGS, WAITING_CHANNEL_NAME, WAITING_CHANNEL_LINK
+) = range(9)
+
+# اعتبارسنجی ورودی‌های کانال اجباری
+CHANNEL_ID_RE = re.compile(r'^-100\d+$')
+INVITE_LINK_RE = re.compile(r'^https?://t\.me/[\w-]+(/[\w-]+)?$')
+
+# جداولی که تغییراتشان با NOTIFY کش‌ها را باطل می‌کند
+NOTIFY_TABLES = ('admins', 'channels', 'categories', 'files', 'auto_delete_settings')
+LISTENER_RECONNECT_BASE_DELAY = 1  # ثانیه
+LISTENER_RECONNECT_MAX_DELAY = 60
+
+# تنظیمات درج گروهی فایل‌ها
+COPY_THRESHOLD = 100  # بیشتر از این تعداد با COPY درج می‌شود
+FILE_COLUMNS = ['category_id', 'file_id', 'file_name', 'file_size', 'file_type', 'caption']
+
+# شناسه کوتاه دسته‌ها (base62)
+CATEGORY_ID_ALPHABET = string.ascii_letters + string.digits
+CATEGORY_ID_LENGTH = 6
+
+# پیام پس از ارسال: استخراج شناسه فایل و عنوان نمایشی بر اساس نوع
+POST_FILE_ID_EXTRACTORS = {
+    'photo': lambda msg: msg.photo[-1].file_id,  # بزرگ‌ترین اندازه عکس
+    'video': lambda msg: msg.video.file_id,
+    'document': lambda msg: msg.document.file_id
+}
+POST_MESSAGE_TYPE_LABELS = {
+    'photo': 'عکس',
+    'video': 'ویدیو',
+    'document': 'سند'
+}
+
+# تنظیمات تایمر خودکار (جدول تک‌ردیفی)
+TIMER_SETTINGS_ID = 1
+DEFAULT_POST_DELETE_MESSAGE = '⏰ زمان مشاهده فایل به پایان رسید!'
+
+# مدت اعتبار کش کانال‌های اجباری، دسته‌ها و تنظیمات تایمر (ثانیه)
+CHANNELS_CACHE_TTL = 60
+CATEGORIES_CACHE_TTL = 60
+TIMER_CACHE_TTL = 60
+# سقف اعتبار کش ادمین‌ها (ثانیه)؛ در صورت قطع شدن اعلان‌های دیتابیس
+ADMINS_CACHE_TTL = 300
+
+# ارسال آلبومی فایل‌ها (sendMediaGroup)
+MEDIA_GROUP_LIMIT = 10  # حداکثر تعداد فایل در هر آلبوم تلگرام
+CAPTION_LIMIT = 1024
+# فایل‌هایی که در یک آلبوم قابل ترکیب هستند گروه یکسان دارند
+MEDIA_GROUP_KINDS = {
+    'photo': 'visual',
+    'video': 'visual',
+    'document': 'document',
+    'audio': 'audio'
+}
+SEND_METHOD_NAMES = {
+    'document': 'send_document',
+    'photo': 'send_photo',
+    'video': 'send_video',
+    'audio': 'send_audio'
+}
+INPUT_MEDIA_TYPES = {
+    'photo': InputMediaPhoto,
+    'video': InputMediaVideo,
+    'document': InputMediaDocument,
+    'audio': InputMediaAudio
+}
+
+# تلاش مجدد بررسی عضویت فقط برای خطاهای گذرا (تاخیر نمایی: 0.2، 0.4، 0.8 ثانیه)
+MEMBERSHIP_MAX_RETRIES = 3
+MEMBERSHIP_RETRY_BASE_DELAY = 0.2
+MEMBERSHIP_MAX_RETRY_AFTER = 5  # انتظار طولانی‌تر برای RetryAfter، کاربر را معطل نمی‌کند
+
+# متدهای فقط‌خواندنی که مشمول محدودیت نرخ ارسال پیام نیستند
+RATE_LIMIT_EXEMPT_ENDPOINTS = frozenset({'getChatMember'})
+
+class BotRateLimiter(AIORateLimiter):
+    """محدودیت نرخ فقط برای ارسال‌ها؛ بررسی عضویت مستقیم ارسال می‌شود"""
+    
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        # chat_id منفی کانال‌ها در محدودکننده گروه (20 درخواست در دقیقه برای هر کانال)
+        # شمرده می‌شود و بررسی عضویت کاربران را برای دقایق در صف نگه می‌دارد
+        if endpoint in RATE_LIMIT_EXEMPT_ENDPOINTS:
+            return await callback(*args, **kwargs)
+        return await super().process_request(
+            callback, args, kwargs, endpoint, data, rate_limit_args
+        )
+
+class PreparedConnection(asyncpg.Connection):
+    """اتصال asyncpg با کش صریح دستورات آماده (prepared statements)"""
+    __slots__ = ('prepared',)
 
 class Database:
     """مدیریت دیتابیس PostgreSQL"""
     
     def __init__(self):
         self.pool = None
+        self.listener_conn = None  # اتصال اختصاصی LISTEN
+        self._listeners = []  # (کانال، تابع) برای ثبت مجدد پس از اتصال دوباره
+        self._listener_reconnect_task = None
 
     async def connect(self):
         """اتصال به دیتابیس"""
-        self.pool = await asyncpg.create_pool(os.getenv('DATABASE_URL'))
+        self.pool = await asyncpg.create_pool(
+            os.getenv('DATABASE_URL'),
+            min_size=DB_POOL_MIN,
+            max_size=DB_POOL_MAX,
+            max_inactive_connection_lifetime=DB_MAX_INACTIVE_LIFETIME,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            max_cached_statement_lifetime=DB_MAX_CACHED_STATEMENT_LIFETIME,
+            command_timeout=DB_COMMAND_TIMEOUT,
+            connection_class=PreparedConnection,
+            init=self._init_connection
+        )
         await self.init_db()
     
+    async def close(self):
+        """بستن اتصال شنونده و استخر اتصال‌ها"""
+        if self._listener_reconnect_task is not None:
+            self._listener_reconnect_task.cancel()
+        if self.listener_conn is not None:
+            # قبل از بستن خالی می‌شود تا شنونده قطع اتصال، اتصال مجدد را آغاز نکند
+            conn, self.listener_conn = self.listener_conn, None
+            await conn.close()
+        if self.pool is not None:
+            await self.pool.close()
+    
+    @staticmethod
+    async def _init_connection(conn):
+        """تنظیم تبدیل خودکار ستون‌های JSON به شیء پایتون"""
+        conn.prepared = {}
+        await conn.set_type_codec(
+            'json',
+            encoder=json.dumps,
+            decoder=json_loads,  # فایل‌های دسته (json_agg) در هر مشاهده دسته تجزیه می‌شوند
+            schema='pg_catalog'
+        )
+    
+    async def _fetchrow_prepared(self, query: str, *args):
+        """اجرای کوئری پرتکرار با دستور آماده‌شده مختص هر اتصال"""
+        async with self.pool.acquire() as conn:
+            statement = conn.prepared.get(query)
+            if statement is None:
+                statement = conn.prepared[query] = await conn.prepare(query)
+            return await statement.fetchrow(*args)
+    
+    @contextlib.asynccontextmanager
+    async def _migration_connection(self):
+        """اتصال مستقل بدون command_timeout برای مهاجرت‌های طولانی (بازنویسی جدول، ساخت ایندکس)"""
+        conn = await asyncpg.connect(os.getenv('DATABASE_URL'))
+        try:
+            yield conn
+        finally:
+            await conn.close()
+    
+    @staticmethod
+    async def _run_once(conn, name: str, query: str, *args):
+        """اجرای یک مهاجرت داده فقط یکبار (ثبت در جدول schema_migrations)"""
+        async with conn.transaction():
+            # ردیف نشانه تا پایان تراکنش قفل است؛ نمونه همزمان دیگر منتظر می‌ماند و رد می‌شود
+            applied = await conn.fetchval(
+                "INSERT INTO schema_migrations(name) VALUES($1) "
+                "ON CONFLICT (name) DO NOTHING RETURNING name",
+                name
+            )
+            if applied:
+                await conn.execute(query, *args)
+    
     async def init_db(self):
         """ایجاد جداول مورد نیاز"""
-        async with self.pool.acquire() as conn:
+        async with self._migration_connection() as conn:
+            # مهاجرت‌های داده یکباره
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    name TEXT PRIMARY KEY,
+                    applied_at TIMESTAMP DEFAULT NOW()
+                )
+            ''')
+            
             # جدول دسته‌ها
             await conn.execute('''
                 CREATE TABLE IF NOT EXISTS categories (
@@ -86,6 +325,14 @@ class Database:
                 )
             ''')
             
+            # نوع شمارشی فایل‌ها (4 بایت به جای رشته متنی)
+            await conn.execute('''
+                DO $$ BEGIN
+                    CREATE TYPE file_kind AS ENUM ('document', 'photo', 'video', 'audio');
+                EXCEPTION WHEN duplicate_object THEN NULL;
+                END $$
+            ''')
+            
             # جدول فایل‌ها
             await conn.execute('''
                 CREATE TABLE IF NOT EXISTS files (
@@ -94,12 +341,23 @@ class Database:
                     file_id TEXT NOT NULL UNIQUE,
                     file_name TEXT NOT NULL,
                     file_size BIGINT NOT NULL,
-                    file_type TEXT NOT NULL,
+                    file_type file_kind NOT NULL,
                     caption TEXT,
                     upload_date TIMESTAMP DEFAULT NOW()
                 )
             ''')
             
+            # مهاجرت جداول قدیمی که file_type را به صورت TEXT دارند
+            legacy_type = await conn.fetchval(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = 'files' AND column_name = 'file_type'"
+            )
+            if legacy_type == 'text':
+                await conn.execute(
+                    'ALTER TABLE files ALTER COLUMN file_type TYPE file_kind '
+                    'USING file_type::file_kind'
+                )
+            
             # جدول کانال‌ها
             await conn.execute('''
                 CREATE TABLE IF NOT EXISTS channels (
@@ -120,6 +378,13 @@ class Database:
                     post_delete_message TEXT DEFAULT '⏰ زمان مشاهده فایل به پایان رسید!'
                 )
             ''')
+            # تنظیمات تایمر همیشه در ردیف id = 1 نگهداری می‌شود
+            await conn.execute(
+                "UPDATE auto_delete_settings SET id = $1 "
+                "WHERE id = (SELECT MIN(id) FROM auto_delete_settings) "
+                "AND NOT EXISTS (SELECT 1 FROM auto_delete_settings WHERE id = $1)",
+                TIMER_SETTINGS_ID
+            )
             
             # جدول ادمین‌ها
             await conn.execute('''
@@ -145,61 +410,161 @@ class Database:
             ''')
             
             # ایندکس‌های بهینه‌سازی
-            await conn.execute('CREATE INDEX IF NOT EXISTS idx_files_category ON files(category_id)')
+            # ایندکس فایل‌های دسته به ترتیب درج (بدون ORDER BY جداگانه)؛
+            # کپشن در ایندکس نمی‌آید: ردیف ایندکس btree حداکثر 2704 بایت است
+            await conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_files_category_order ON files(category_id, id)'
+            )
+            await conn.execute('DROP INDEX IF EXISTS idx_files_category_covering')
+            await conn.execute('DROP INDEX IF EXISTS idx_files_category')
+            # کوتاه‌سازی کپشن‌های قدیمی (ذخیره‌شده پیش از کوتاه‌سازی هنگام دریافت)؛
+            # پس از حذف ایندکس پوششی قدیمی تا ردیف‌های آن از سقف btree عبور نکنند
+            await self._run_once(
+                conn,
+                'truncate_legacy_captions',
+                'UPDATE files SET caption = left(caption, $1) WHERE length(caption) > $1',
+                CAPTION_LIMIT
+            )
+            await conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_post_messages_category ON post_messages(category_id)'
+            )
+            # ایندکس جزئی برای جستجوی پیام سراسری (is_global) در نمایش دسته
+            await conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_post_messages_global ON post_messages(id) WHERE is_global'
+            )
+            
+            # اعلان تغییرات جداول کش‌شده برای باطل کردن کش همه نمونه‌های ربات
+            await conn.execute('''
+                CREATE OR REPLACE FUNCTION notify_table_changed() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify(TG_TABLE_NAME || '_changed', '');
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            ''')
+            # فقط تریگرهای موجود نبودن ساخته می‌شوند تا هر راه‌اندازی روی جداول پرکاربرد
+            # قفل ACCESS EXCLUSIVE نگیرد؛ قفل advisory از ساخت همزمان توسط دو نمونه جلوگیری می‌کند
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext('notify_table_changed'))")
+                for table in NOTIFY_TABLES:
+                    exists = await conn.fetchval(
+                        "SELECT EXISTS(SELECT 1 FROM pg_trigger "
+                        "WHERE tgname = $1 AND tgrelid = $2::regclass)",
+                        f'{table}_changed',
+                        table
+                    )
+                    if not exists:
+                        await conn.execute(
+                            f'CREATE TRIGGER {table}_changed '
+                            f'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} '
+                            f'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_changed()'
+                        )
             logger.info("Database initialized")
+    
+    async def listen(self, channel: str, callback):
+        """ثبت شنونده برای اعلان‌های PostgreSQL (LISTEN/NOTIFY)"""
+        # اتصال‌های استخر هنگام بازگشت ریست می‌شوند، پس از اتصال مستقل استفاده می‌کنیم
+        self._listeners.append((channel, callback))
+        if self.listener_conn is None:
+            await self._connect_listener()
+        else:
+            await self.listener_conn.add_listener(channel, callback)
+    
+    async def _connect_listener(self):
+        """برقراری اتصال LISTEN و ثبت همه شنونده‌ها"""
+        conn = await asyncpg.connect(os.getenv('DATABASE_URL'))
+        for channel, callback in self._listeners:
+            await conn.add_listener(channel, callback)
+        conn.add_termination_listener(self._on_listener_terminated)
+        self.listener_conn = conn
+    
+    def _on_listener_terminated(self, conn):
+        """شروع اتصال مجدد پس از قطع غیرمنتظره اتصال LISTEN"""
+        if conn is not self.listener_conn:  # بسته شدن عمدی در close()
+            return
+        self.listener_conn = None
+        logger.warning("اتصال LISTEN قطع شد؛ تلاش برای اتصال مجدد")
+        self._listener_reconnect_task = asyncio.create_task(self._reconnect_listener())
+    
+    async def _reconnect_listener(self):
+        """اتصال مجدد LISTEN با تاخیر افزایشی"""
+        delay = LISTENER_RECONNECT_BASE_DELAY
+        while True:
+            try:
+                await self._connect_listener()
+                break
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("اتصال مجدد LISTEN ناموفق بود: %s", e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LISTENER_RECONNECT_MAX_DELAY)
+        
+        # اعلان‌های زمان قطعی از دست رفته‌اند؛ همه کش‌ها باطل می‌شوند
+        for _, callback in self._listeners:
+            callback()
+        logger.info("اتصال LISTEN دوباره برقرار شد")
 
     # --- مدیریت دسته‌ها ---
     async def add_category(self, name: str, created_by: int) -> str:
         """ایجاد دسته جدید"""
-        category_id = str(uuid.uuid4())[:8]
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                "INSERT INTO categories(id, name, created_by) VALUES($1, $2, $3)",
+        while True:
+            category_id = ''.join(
+                secrets.choice(CATEGORY_ID_ALPHABET) for _ in range(CATEGORY_ID_LENGTH)
+            )
+            # در صورت تکراری بودن شناسه، شناسه جدید تولید می‌شود
+            inserted = await self.pool.fetchval(
+                "INSERT INTO categories(id, name, created_by) VALUES($1, $2, $3) "
+                "ON CONFLICT (id) DO NOTHING RETURNING id",
                 category_id, name, created_by
             )
-        return category_id
-    
-    async def get_categories(self) -> dict:
-        """دریافت تمام دسته‌ها"""
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch("SELECT id, name FROM categories")
-            return {row['id']: row['name'] for row in rows}
+            if inserted:
+                return category_id
+    
+    async def get_categories(self) -> list:
+        """دریافت تمام دسته‌ها به همراه تعداد فایل‌ها (id، name، file_count)"""
+        return await self.pool.fetch(
+            "SELECT c.id, c.name, COUNT(f.id) AS file_count "
+            "FROM categories c LEFT JOIN files f ON f.category_id = c.id "
+            "GROUP BY c.id, c.name ORDER BY c.name"
+        )
     
-    async def get_category(self, category_id: str) -> dict:
+    async def get_category(self, category_id: str) -> asyncpg.Record:
         """دریافت اطلاعات یک دسته"""
-        async with self.pool.acquire() as conn:
-            category = await conn.fetchrow(
-                "SELECT name, created_by FROM categories WHERE id = $1", category_id
-            )
-            if not category:
-                return None
-                
-            files = await conn.fetch(
-                "SELECT file_id, file_type, caption FROM files WHERE category_id = $1", category_id
-            )
-            
-            # دریافت پیام پس از ارسال (اولویت با پیام اختصاصی دسته)
-            post_message = await conn.fetchrow(
-                "SELECT message_type, content, caption FROM post_messages "
-                "WHERE category_id = $1 OR (is_global AND NOT EXISTS "
-                "(SELECT 1 FROM post_messages WHERE category_id = $1)) "
-                "ORDER BY is_global ASC LIMIT 1", 
-                category_id
-            )
-            
-            return {
-                'name': category['name'],
-                'files': [dict(file) for file in files],
-                'post_message': dict(post_message) if post_message else None
-            }
-            
+        # دسته، فایل‌ها و پیام پس از ارسال در یک رفت‌وبرگشت
+        # (اولویت پیام با پیام اختصاصی دسته است)
+        # ردیف Record مستقیماً برگردانده می‌شود (name، files، post_message)
+        return await self._fetchrow_prepared(
+            "SELECT c.name, "
+            "COALESCE((SELECT json_agg(json_build_object("
+            "'file_id', f.file_id, 'file_type', f.file_type, 'caption', f.caption"
+            ") ORDER BY f.id) FROM files f WHERE f.category_id = c.id), '[]'::json) AS files, "
+            "(SELECT json_build_object("
+            "'message_type', p.message_type, 'content', p.content, 'caption', p.caption"
+            ") FROM post_messages p "
+            "WHERE p.category_id = c.id OR (p.is_global AND NOT EXISTS "
+            "(SELECT 1 FROM post_messages WHERE category_id = c.id)) "
+            "ORDER BY p.is_global ASC LIMIT 1) AS post_message "
+            "FROM categories c WHERE c.id = $1",
+            category_id
+        )
+        
+    async def get_category_summary(self, category_id: str) -> dict:
+        """دریافت خلاصه یک دسته (بدون دریافت لیست فایل‌ها)"""
+        row = await self._fetchrow_prepared(
+            "SELECT c.name, "
+            "(SELECT COUNT(*) FROM files WHERE category_id = c.id) AS file_count, "
+            "EXISTS(SELECT 1 FROM post_messages "
+            "WHERE category_id = c.id OR is_global) AS has_post_message "
+            "FROM categories c WHERE c.id = $1",
+            category_id
+        )
+        return dict(row) if row else None
+    
     async def delete_category(self, category_id: str) -> bool:
         """حذف دسته"""
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM categories WHERE id = $1", category_id
-            )
-            return result.split()[-1] == '1'
+        deleted = await self.pool.fetchval(
+            "DELETE FROM categories WHERE id = $1 RETURNING 1", category_id
+        )
+        return deleted is not None
 
     # --- مدیریت فایل‌ها ---
     async def add_file(self, category_id: str, file_info: dict) -> bool:
@@ -229,132 +594,148 @@ class Database:
                 return False
     
     async def add_files(self, category_id: str, files: list) -> int:
-        async with self.pool.acquire() as conn:
-            inserted_count = 0
-            for f in files:
-                try:
-                    # بررسی تکراری نبودن فایل
-                    exists = await conn.fetchval(
-                        "SELECT 1 FROM files WHERE file_id = $1", 
-                        f['file_id']
-                    )
-                    if exists:
-                        continue
-                    
+        """افزودن گروهی فایل‌ها به دسته"""
+        rows = [
+            (
+                category_id,
+                f['file_id'],
+                f['file_name'],
+                f['file_size'],
+                f['file_type'],
+                f.get('caption', '')
+            )
+            for f in files
+        ]
+        if not rows:
+            return 0
+
+        if len(rows) > COPY_THRESHOLD:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    # مسیر سریع: انتقال با پروتکل COPY به جدول موقت
+                    # (جدول موقت برای هر اتصال یکبار ساخته و پس از هر تراکنش خالی می‌شود)
                     await conn.execute(
+                        "CREATE TEMP TABLE IF NOT EXISTS files_stage ("
+                        "category_id TEXT, file_id TEXT, file_name TEXT, "
+                        "file_size BIGINT, file_type file_kind, caption TEXT"
+                        ") ON COMMIT DELETE ROWS"
+                    )
+                    await conn.copy_records_to_table(
+                        'files_stage', records=rows, columns=FILE_COLUMNS
+                    )
+                    return await conn.fetchval(
+                        "WITH inserted AS ("
                         "INSERT INTO files(category_id, file_id, file_name, file_size, file_type, caption) "
-                        "VALUES($1, $2, $3, $4, $5, $6)",
-                        category_id,
-                        f['file_id'],
-                        f['file_name'],
-                        f['file_size'],
-                        f['file_type'],
-                        f.get('caption', '')
+                        "SELECT DISTINCT ON (file_id) category_id, file_id, file_name, file_size, file_type, caption "
+                        "FROM files_stage ON CONFLICT (file_id) DO NOTHING RETURNING 1"
+                        ") SELECT COUNT(*) FROM inserted"
                     )
-                    inserted_count += 1
-                except asyncpg.UniqueViolationError:
-                    continue
-            return inserted_count
+
+        # درج یکجا در یک رفت‌وبرگشت؛ RETURNING فقط ردیف‌های جدید را برمی‌گرداند
+        # (یک دستور به تنهایی اتمیک است و به BEGIN/COMMIT جداگانه نیازی ندارد)
+        columns = list(zip(*rows))
+        inserted = await self.pool.fetch(
+            "INSERT INTO files(category_id, file_id, file_name, file_size, file_type, caption) "
+            "SELECT category_id, file_id, file_name, file_size, file_type::file_kind, caption "
+            "FROM unnest($1::text[], $2::text[], $3::text[], $4::bigint[], $5::text[], $6::text[]) "
+            "AS t(category_id, file_id, file_name, file_size, file_type, caption) "
+            "ON CONFLICT (file_id) DO NOTHING RETURNING 1",
+            *columns
+        )
+        return len(inserted)
 
     # --- مدیریت کانال‌ها ---
     async def add_channel(self, channel_id: str, name: str, link: str) -> bool:
         """افزودن کانال اجباری"""
-        async with self.pool.acquire() as conn:
-            try:
-                await conn.execute(
-                    "INSERT INTO channels(channel_id, channel_name, invite_link) VALUES($1, $2, $3)",
-                    channel_id, name, link
-                )
-                return True
-            except asyncpg.UniqueViolationError:
-                return False
+        try:
+            await self.pool.execute(
+                "INSERT INTO channels(channel_id, channel_name, invite_link) VALUES($1, $2, $3)",
+                channel_id, name, link
+            )
+            return True
+        except asyncpg.UniqueViolationError:
+            return False
     
     async def get_channels(self) -> list:
         """دریافت لیست کانال‌ها"""
-        async with self.pool.acquire() as conn:
-            return await conn.fetch("SELECT channel_id, channel_name, invite_link FROM channels")
+        return await self.pool.fetch("SELECT channel_id, channel_name, invite_link FROM channels")
     
     async def delete_channel(self, channel_id: str) -> bool:
         """حذف کانال"""
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM channels WHERE channel_id = $1", channel_id
-            )
-            return result.split()[-1] == '1'
+        deleted = await self.pool.fetchval(
+            "DELETE FROM channels WHERE channel_id = $1 RETURNING 1", channel_id
+        )
+        return deleted is not None
 
     # --- مدیریت تایمر خودکار ---
     async def get_timer_settings(self):
         """دریافت تنظیمات تایمر"""
-        async with self.pool.acquire() as conn:
-            return await conn.fetchrow("SELECT * FROM auto_delete_settings LIMIT 1")
+        return await self.pool.fetchrow(
+            "SELECT * FROM auto_delete_settings WHERE id = $1", TIMER_SETTINGS_ID
+        )
     
     async def update_timer_settings(self, is_active: bool, delete_after: int = None, message: str = None):
         """به‌روزرسانی تنظیمات تایمر"""
-        async with self.pool.acquire() as conn:
-            settings = await self.get_timer_settings()
-            
-            if settings:
-                # به‌روزرسانی تنظیمات موجود
-                await conn.execute(
-                    "UPDATE auto_delete_settings SET "
-                    "is_active = $1, "
-                    "delete_after_seconds = COALESCE($2, delete_after_seconds), "
-                    "post_delete_message = COALESCE($3, post_delete_message) "
-                    "WHERE id = $4",
-                    is_active,
-                    delete_after,
-                    message,
-                    settings['id']
-                )
-            else:
-                # ایجاد تنظیمات جدید
-                await conn.execute(
-                    "INSERT INTO auto_delete_settings(is_active, delete_after_seconds, post_delete_message) "
-                    "VALUES($1, $2, $3)",
-                    is_active,
-                    delete_after,
-                    message
-                )
+        # upsert در یک رفت‌وبرگشت؛ مقادیر None تنظیم فعلی را تغییر نمی‌دهند
+        await self.pool.execute(
+            "INSERT INTO auto_delete_settings AS s "
+            "(id, is_active, delete_after_seconds, post_delete_message) "
+            "VALUES($1, COALESCE($2, FALSE), $3, COALESCE($4, $5)) "
+            "ON CONFLICT (id) DO UPDATE SET "
+            "is_active = COALESCE($2, s.is_active), "
+            "delete_after_seconds = COALESCE($3, s.delete_after_seconds), "
+            "post_delete_message = COALESCE($4, s.post_delete_message)",
+            TIMER_SETTINGS_ID,
+            is_active,
+            delete_after,
+            message,
+            DEFAULT_POST_DELETE_MESSAGE
+        )
 
     # --- مدیریت ادمین‌ها ---
     async def add_admin(self, user_id: int, is_super: bool, added_by: int):
         """افزودن ادمین جدید"""
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                "INSERT INTO admins(user_id, is_super, added_by) "
-                "VALUES($1, $2, $3) ON CONFLICT (user_id) DO UPDATE "
-                "SET is_super = EXCLUDED.is_super",
-                user_id, is_super, added_by
-            )
+        await self.pool.execute(
+            "INSERT INTO admins(user_id, is_super, added_by) "
+            "VALUES($1, $2, $3) ON CONFLICT (user_id) DO UPDATE "
+            "SET is_super = EXCLUDED.is_super",
+            user_id, is_super, added_by
+        )
     
-    async def remove_admin(self, user_id: int):
+    async def add_admins_bulk(self, admins: list):
+        """افزودن گروهی ادمین‌ها با یک executemany"""
+        await self.pool.executemany(
+            "INSERT INTO admins(user_id, is_super, added_by) "
+            "VALUES($1, $2, $3) ON CONFLICT (user_id) DO UPDATE "
+            "SET is_super = EXCLUDED.is_super",
+            admins
+        )
+    
+    async def remove_admin(self, user_id: int) -> bool:
         """حذف ادمین"""
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                "DELETE FROM admins WHERE user_id = $1 AND is_super = FALSE",
-                user_id
-            )
+        deleted = await self.pool.fetchval(
+            "DELETE FROM admins WHERE user_id = $1 AND is_super = FALSE RETURNING user_id",
+            user_id
+        )
+        return deleted is not None
     
     async def is_admin(self, user_id: int) -> bool:
         """بررسی ادمین بودن کاربر"""
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval(
-                "SELECT EXISTS(SELECT 1 FROM admins WHERE user_id = $1)",
-                user_id
-            )
+        return await self.pool.fetchval(
+            "SELECT EXISTS(SELECT 1 FROM admins WHERE user_id = $1)",
+            user_id
+        )
     
     async def is_super_admin(self, user_id: int) -> bool:
         """بررسی سوپر ادمین بودن کاربر"""
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval(
-                "SELECT is_super FROM admins WHERE user_id = $1",
-                user_id
-            )
+        return await self.pool.fetchval(
+            "SELECT is_super FROM admins WHERE user_id = $1",
+            user_id
+        )
     
     async def get_admins(self) -> list:
         """دریافت لیست ادمین‌ها"""
-        async with self.pool.acquire() as conn:
-            return await conn.fetch("SELECT user_id, is_super FROM admins")
+        return await self.pool.fetch("SELECT user_id, is_super FROM admins")
     
     # --- مدیریت پیام‌های پس از ارسال ---
     async def set_post_message(self, category_id: str, message_type: str, content: str, caption: str = None, is_global: bool = False):
@@ -379,11 +760,46 @@ class Database:
 
     async def delete_post_message(self, category_id: str):
         """حذف پیام پس از ارسال"""
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                "DELETE FROM post_messages WHERE category_id = $1",
-                category_id
-            )
+        await self.pool.execute(
+            "DELETE FROM post_messages WHERE category_id = $1",
+            category_id
+        )
+
+class TTLCache:
+    """کش درون‌حافظه‌ای یک مقدار با مدت اعتبار و بارگذاری تک‌درخواستی"""
+    
+    def __init__(self, loader, ttl: float):
+        self._loader = loader
+        self._ttl = ttl
+        self._value = None
+        self._loaded = False
+        self._ts = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+    
+    def _expired(self) -> bool:
+        """بررسی نیاز به بارگذاری مجدد"""
+        return not self._loaded or time.monotonic() - self._ts >= self._ttl
+    
+    async def get(self):
+        """دریافت مقدار از کش یا بارگذاری آن"""
+        if not self._expired():
+            return self._value
+        
+        # فقط یک درخواست همزمان کش را از دیتابیس پر می‌کند
+        async with self._lock:
+            if self._expired():
+                generation = self._generation
+                self._value = await self._loader()
+                self._ts = time.monotonic()
+                # اگر حین بارگذاری باطل شده باشد، درخواست بعدی دوباره بارگذاری می‌کند
+                self._loaded = generation == self._generation
+            return self._value
+    
+    def invalidate(self, *args):
+        """باطل کردن کش (قابل استفاده به عنوان شنونده اعلان‌ها)"""
+        self._loaded = False
+        self._generation += 1
 
 class BotManager:
     """مدیریت اصلی ربات"""
@@ -391,31 +807,152 @@ class BotManager:
     def __init__(self):
         self.db = Database()
         self.bot_username = None
+        self._link_prefix = None
+        self.admin_ids: set[int] = set()  # کش درون‌حافظه‌ای ادمین‌ها
+        self.super_admin_ids: set[int] = set()
+        self._admins_dirty = False
+        self._admins_loaded_ts = 0.0
+        self._admins_lock = asyncio.Lock()
+        self.channels_cache = TTLCache(self.db.get_channels, CHANNELS_CACHE_TTL)
+        self.categories_cache = TTLCache(self._load_categories, CATEGORIES_CACHE_TTL)
+        self.timer_cache = TTLCache(self.db.get_timer_settings, TIMER_CACHE_TTL)
     
     async def init(self, bot_username: str):
         """راه‌اندازی اولیه"""
         self.bot_username = bot_username
+        # پیشوند لینک دسته‌ها یکبار ساخته می‌شود
+        # (Fallback در صورت عدم وجود یوزرنیم: شناسه عددی ربات)
+        link_target = bot_username or BOT_TOKEN.split(':')[0]
+        self._link_prefix = f"https://t.me/{link_target}?start=cat_"
         await self.db.connect()
         
-        # افزودن ادمین‌های اولیه از متغیر محیطی
-        for admin_id in ADMIN_IDS:
-            await self.db.add_admin(admin_id, True, 0)
+        await self.load_admins()
+        
+        # افزودن ادمین‌های اولیه از متغیر محیطی (فقط موارد ثبت‌نشده، در یک executemany)
+        missing = [admin_id for admin_id in ADMIN_IDS if admin_id not in self.super_admin_ids]
+        if missing:
+            await self.db.add_admins_bulk([(admin_id, True, 0) for admin_id in missing])
+            self.admin_ids.update(missing)
+            self.super_admin_ids.update(missing)
+        
+        # باطل شدن کش‌ها با تغییرات دیتابیس (از هر نمونه ربات یا ویرایش دستی)
+        await self.db.listen('admins_changed', self._on_admins_changed)
+        await self.db.listen('channels_changed', self.channels_cache.invalidate)
+        # تعداد فایل‌ها در لیست دسته‌ها نمایش داده می‌شود
+        await self.db.listen('categories_changed', self.categories_cache.invalidate)
+        await self.db.listen('files_changed', self.categories_cache.invalidate)
+        await self.db.listen('auto_delete_settings_changed', self.timer_cache.invalidate)
+    
+    def _on_admins_changed(self, *args):
+        """علامت‌گذاری کش ادمین‌ها برای بارگذاری مجدد"""
+        self._admins_dirty = True
+    
+    async def load_admins(self):
+        """بارگذاری لیست ادمین‌ها در کش"""
+        self._admins_dirty = False
+        admins = await self.db.get_admins()
+        self.admin_ids = {admin['user_id'] for admin in admins}
+        self.super_admin_ids = {admin['user_id'] for admin in admins if admin['is_super']}
+        self._admins_loaded_ts = time.monotonic()
+    
+    def _admins_cache_stale(self) -> bool:
+        """بررسی نیاز به بارگذاری مجدد کش ادمین‌ها"""
+        return (
+            self._admins_dirty
+            or time.monotonic() - self._admins_loaded_ts >= ADMINS_CACHE_TTL
+        )
+    
+    async def _refresh_admins(self):
+        """بارگذاری مجدد کش ادمین‌ها در صورت نیاز (فقط یک درخواست همزمان)"""
+        if not self._admins_cache_stale():
+            return
+        async with self._admins_lock:
+            if self._admins_cache_stale():
+                await self.load_admins()
     
     async def is_admin(self, user_id: int) -> bool:
-        """بررسی ادمین بودن کاربر"""
-        return await self.db.is_admin(user_id)
+        """بررسی ادمین بودن کاربر (از کش، بدون مراجعه به دیتابیس)"""
+        await self._refresh_admins()
+        return user_id in self.admin_ids
+    
+    async def add_admin(self, user_id: int, is_super: bool, added_by: int):
+        """افزودن ادمین و به‌روزرسانی کش"""
+        await self.db.add_admin(user_id, is_super, added_by)
+        self.admin_ids.add(user_id)
+        if is_super:
+            self.super_admin_ids.add(user_id)
+        else:
+            self.super_admin_ids.discard(user_id)
+    
+    async def remove_admin(self, user_id: int) -> bool:
+        """حذف ادمین و به‌روزرسانی کش"""
+        removed = await self.db.remove_admin(user_id)
+        if removed:
+            self.admin_ids.discard(user_id)
+        return removed
     
     async def is_super_admin(self, user_id: int) -> bool:
-        """بررسی سوپر ادمین بودن کاربر"""
-        return await self.db.is_super_admin(user_id)
+        """بررسی سوپر ادمین بودن کاربر (از کش)"""
+        await self._refresh_admins()
+        return user_id in self.super_admin_ids
+    
+    async def get_channels(self) -> list:
+        """دریافت لیست کانال‌ها (با کش TTL)"""
+        return await self.channels_cache.get()
+    
+    async def add_channel(self, channel_id: str, name: str, link: str) -> bool:
+        """افزودن کانال اجباری و باطل کردن کش"""
+        success = await self.db.add_channel(channel_id, name, link)
+        self.channels_cache.invalidate()
+        return success
+    
+    async def delete_channel(self, channel_id: str) -> bool:
+        """حذف کانال و باطل کردن کش"""
+        success = await self.db.delete_channel(channel_id)
+        self.channels_cache.invalidate()
+        return success
+    
+    async def get_categories(self) -> list:
+        """دریافت لیست دسته‌ها (با کش TTL)"""
+        return await self.categories_cache.get()
+    
+    async def _load_categories(self) -> list:
+        """بارگذاری دسته‌ها به همراه لینک هر دسته (یکبار برای هر پر شدن کش)"""
+        return [
+            {**category, 'link': self.generate_link(category['id'])}
+            for category in await self.db.get_categories()
+        ]
+    
+    async def add_category(self, name: str, created_by: int) -> str:
+        """ایجاد دسته و باطل کردن کش"""
+        category_id = await self.db.add_category(name, created_by)
+        self.categories_cache.invalidate()
+        return category_id
+    
+    async def delete_category(self, category_id: str) -> bool:
+        """حذف دسته و باطل کردن کش"""
+        success = await self.db.delete_category(category_id)
+        self.categories_cache.invalidate()
+        return success
+    
+    async def add_files(self, category_id: str, files: list) -> int:
+        """ذخیره فایل‌ها و باطل کردن کش دسته‌ها (تعداد فایل‌ها تغییر می‌کند)"""
+        count = await self.db.add_files(category_id, files)
+        self.categories_cache.invalidate()
+        return count
+    
+    async def get_timer_settings(self):
+        """دریافت تنظیمات تایمر (با کش TTL)"""
+        return await self.timer_cache.get()
+    
+    async def update_timer_settings(self, is_active: bool, delete_after: int = None, message: str = None):
+        """به‌روزرسانی تنظیمات تایمر و باطل کردن کش"""
+        await self.db.update_timer_settings(is_active, delete_after, message)
+        self.timer_cache.invalidate()
     
     def generate_link(self, category_id: str) -> str:
         """تولید لینک دسته با یوزرنیم صحیح"""
-        if self.bot_username:
-            return f"https://t.me/{self.bot_username}?start=cat_{category_id}"
-        # Fallback در صورت عدم وجود یوزرنیم
-        bot_id = BOT_TOKEN.split(':')[0]
-        return f"https://t.me/{bot_id}?start=cat_{category_id}"
+        return self._link_prefix + category_id
     
     def extract_file_info(self, update: Update) -> dict:
         """استخراج اطلاعات فایل از پیام"""
@@ -445,23 +982,56 @@ class BotManager:
             'file_name': file_name,
             'file_size': file.file_size,
             'file_type': file_type,
-            'caption': msg.caption or ''
+            'caption': (msg.caption or '')[:CAPTION_LIMIT]  # کوتاه‌سازی یکباره هنگام ذخیره
         }
     
     async def check_channel_membership(self, user_id: int, channel_id: str, context: ContextTypes.DEFAULT_TYPE) -> bool:
         """بررسی عضویت کاربر در کانال"""
-        for _ in range(3):  # 3 بار تلاش
+        for attempt in range(MEMBERSHIP_MAX_RETRIES + 1):
             try:
                 member = await context.bot.get_chat_member(chat_id=channel_id, user_id=user_id)
-                if member.status in ['member', 'administrator', 'creator']:
-                    return True
+                # پاسخ موفق قطعی است؛ نیازی به تلاش مجدد نیست
+                return member.status in ('member', 'administrator', 'creator')
+            except (BadRequest, Forbidden) as e:
+                # خطای قطعی (کانال/کاربر نامعتبر، عدم دسترسی ربات)؛
+                # BadRequest زیرکلاس NetworkError است و باید پیش از آن بررسی شود
+                logger.warning("خطا در بررسی عضویت: %s", e)
+                return False
+            except RetryAfter as e:
+                # محدودیت نرخ: فقط پس از زمان اعلام‌شده توسط تلگرام تلاش مجدد
+                logger.warning("محدودیت نرخ در بررسی عضویت: %s", e)
+                if e.retry_after > MEMBERSHIP_MAX_RETRY_AFTER:
+                    return False
+                delay = e.retry_after
+            except NetworkError as e:
+                # خطای گذرای شبکه: تلاش مجدد با تاخیر افزایشی
+                logger.warning("خطای گذرا در بررسی عضویت: %s", e)
+                delay = MEMBERSHIP_RETRY_BASE_DELAY * 2 ** attempt
+            except TelegramError as e:
+                # سایر خطاهای تلگرام نیز با تلاش مجدد برطرف نمی‌شوند
+                logger.warning("خطا در بررسی عضویت: %s", e)
+                return False
             except Exception as e:
-                logger.warning(f"خطا در بررسی عضویت: {e}")
+                logger.error("خطای غیرمنتظره در بررسی عضویت: %s", e)
+                return False
             
-            await asyncio.sleep(2)  # تاخیر 2 ثانیه‌ای بین هر تلاش
+            if attempt < MEMBERSHIP_MAX_RETRIES:
+                await asyncio.sleep(delay)
         
         return False
     
+    async def get_non_joined_channels(self, user_id: int, channels: list, context: ContextTypes.DEFAULT_TYPE) -> list:
+        """بررسی همزمان عضویت در همه کانال‌ها و بازگرداندن کانال‌های عضونشده"""
+        results = await asyncio.gather(*(
+            self.check_channel_membership(user_id, channel['channel_id'], context)
+            for channel in channels
+        ), return_exceptions=True)
+        # خطای پیش‌بینی‌نشده در یک کانال، بقیه بررسی‌ها را لغو نمی‌کند
+        return [
+            channel for channel, is_member in zip(channels, results)
+            if is_member is not True
+        ]
+    
     async def send_post_message(self, message: Message, context: ContextTypes.DEFAULT_TYPE, post_message: dict):
         """ارسال پیام پس از ارسال فایل‌ها"""
         if not post_message:
@@ -500,11 +1070,26 @@ class BotManager:
                     reply_to_message_id=message.message_id
                 )
         except Exception as e:
-            logger.error(f"خطا در ارسال پیام پس از ارسال: {e}")
+            logger.error("خطا در ارسال پیام پس از ارسال: %s", e)
 
 # ایجاد نمونه
 bot_manager = BotManager()
 
+# نگهداری ارجاع به تسک‌های پس‌زمینه تا پیش از اتمام جمع‌آوری نشوند
+_background_tasks: set = set()
+
+def _log_background_failure(task: asyncio.Task):
+    """ثبت خطای تسک پس‌زمینه"""
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("خطا در ارسال پیام تایید: %s", task.exception())
+
+def reply_in_background(coro):
+    """ارسال پیام تایید بدون انتظار برای پاسخ تلگرام"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_log_background_failure)
+
 # ========================
 # ==== HANDLER FUNCTIONS ===
 # ========================
@@ -530,7 +1115,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "👋 سلام ادمین!\n\n"
         "از منوی زیر انتخاب کنید:",
-        reply_markup=MAIN_MENU
+        reply_markup=MAIN_MENU_JSON
     )
 
 async def handle_category(update: Update, context: ContextTypes.DEFAULT_TYPE, category_id: str):
@@ -552,52 +1137,41 @@ async def handle_category(update: Update, context: ContextTypes.DEFAULT_TYPE, ca
         return
     
     # بررسی عضویت در کانال‌ها
-    channels = await bot_manager.db.get_channels()
+    channels = await bot_manager.get_channels()
     if not channels:
         await send_category_files(message, context, category_id)
         return
     
-    non_joined = []
-    for channel in channels:
-        is_member = await bot_manager.check_channel_membership(user_id, channel['channel_id'], context)
-        if not is_member:
-            non_joined.append(channel)
-    
+    non_joined = await bot_manager.get_non_joined_channels(user_id, channels, context)
     if not non_joined:
         await send_category_files(message, context, category_id)
         return
     
     # ایجاد صفحه عضویت
-    keyboard = []
-    for channel in non_joined:
-        button = InlineKeyboardButton(
-            text=f"📢 {channel['channel_name']}",
-            url=channel['invite_link']
-        )
-        keyboard.append([button])
-    
-    keyboard.append([
-        InlineKeyboardButton(
-            "✅ عضو شدم", 
-            callback_data=f"check_{category_id}"
-        )
-    ])
-    
     await message.reply_text(
         "⚠️ برای دسترسی ابتدا در کانال‌های زیر عضو شوید:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=join_channels_keyboard(non_joined, category_id)
     )
 
+def join_channels_keyboard(channels: list, category_id: str) -> InlineKeyboardMarkup:
+    """کیبورد لینک کانال‌های عضونشده به همراه دکمه «عضو شدم»"""
+    keyboard = [
+        [InlineKeyboardButton(text=f"📢 {channel['channel_name']}", url=channel['invite_link'])]
+        for channel in channels
+    ]
+    keyboard.append([InlineKeyboardButton("✅ عضو شدم", callback_data=f"check_{category_id}")])
+    return InlineKeyboardMarkup(keyboard)
+
 async def admin_category_menu(message: Message, category_id: str):
     """منوی مدیریت دسته برای ادمین"""
     try:
-        category = await bot_manager.db.get_category(category_id)
+        category = await bot_manager.db.get_category_summary(category_id)
         if not category:
             await message.reply_text("❌ دسته یافت نشد!")
             return
         
         # بررسی وجود پیام پس از ارسال
-        has_post_message = "✅" if category['post_message'] else "❌"
+        has_post_message = "✅" if category['has_post_message'] else "❌"
         
         keyboard = [
             [InlineKeyboardButton("📁 مشاهده فایل‌ها", callback_data=f"view_{category_id}")],
@@ -608,15 +1182,73 @@ async def admin_category_menu(message: Message, category_id: str):
         
         await message.reply_text(
             f"📂 دسته: {category['name']}\n"
-            f"📦 تعداد فایل‌ها: {len(category['files'])}\n"
+            f"📦 تعداد فایل‌ها: {category['file_count']}\n"
             f"💬 پیام پس از ارسال: {has_post_message}\n\n"
             "لطفا عملیات مورد نظر را انتخاب کنید:",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
     except Exception as e:
-        logger.error(f"خطا در منوی ادمین: {e}")
+        logger.error("خطا در منوی ادمین: %s", e)
         await message.reply_text("❌ خطایی در نمایش منو رخ داد")
 
+def group_media_files(files: list):
+    """تقسیم فایل‌های پشت‌سرهم و قابل ترکیب به آلبوم‌های حداکثر 10تایی"""
+    batch = []
+    for file in files:
+        kind = MEDIA_GROUP_KINDS.get(file['file_type'])
+        if kind is None:
+            continue
+        if batch and (
+            len(batch) == MEDIA_GROUP_LIMIT
+            or MEDIA_GROUP_KINDS[batch[0]['file_type']] != kind
+        ):
+            yield batch
+            batch = []
+        batch.append(file)
+    if batch:
+        yield batch
+
+async def send_single_file(context: ContextTypes.DEFAULT_TYPE, chat_id: int, file: dict):
+    """ارسال یک فایل با متد مخصوص نوع آن"""
+    send_func = getattr(context.bot, SEND_METHOD_NAMES[file['file_type']])
+    await send_func(
+        chat_id=chat_id,
+        **{file['file_type']: file['file_id']},
+        caption=file.get('caption') or '',
+        read_timeout=FILE_SEND_READ_TIMEOUT,
+        write_timeout=FILE_SEND_WRITE_TIMEOUT
+    )
+
+async def send_file_batch(context: ContextTypes.DEFAULT_TYPE, chat_id: int, batch: list):
+    """ارسال یک آلبوم (یا فایل تکی) به کاربر"""
+    if len(batch) == 1:
+        # آلبوم حداقل دو عضو لازم دارد
+        await send_single_file(context, chat_id, batch[0])
+        return
+    
+    try:
+        await context.bot.send_media_group(
+            chat_id=chat_id,
+            media=[
+                INPUT_MEDIA_TYPES[file['file_type']](
+                    file['file_id'],
+                    caption=file.get('caption') or ''
+                )
+                for file in batch
+            ],
+            read_timeout=FILE_SEND_READ_TIMEOUT,
+            write_timeout=FILE_SEND_WRITE_TIMEOUT
+        )
+    except BadRequest as e:
+        # یک file_id نامعتبر کل آلبوم را رد می‌کند؛ فایل‌ها تکی ارسال می‌شوند
+        # تا فقط همان فایل از دست برود
+        logger.warning("ارسال آلبوم ناموفق بود، ارسال تکی فایل‌ها: %s", e)
+        for file in batch:
+            try:
+                await send_single_file(context, chat_id, file)
+            except TelegramError as e:
+                logger.error("ارسال فایل خطا: %s", e)
+
 async def send_category_files(message: Message, context: ContextTypes.DEFAULT_TYPE, category_id: str):
     """ارسال فایل‌های یک دسته"""
     try:
@@ -629,32 +1261,19 @@ async def send_category_files(message: Message, context: ContextTypes.DEFAULT_TY
         
         await message.reply_text(f"📤 ارسال فایل‌های '{category['name']}'...")
         
-        # ارسال فایل‌ها
-        for file in category['files']:
+        # ارسال فایل‌ها به صورت آلبوم (هر درخواست تا 10 فایل)
+        # (محدودیت نرخ و خطای RetryAfter توسط AIORateLimiter مدیریت می‌شود)
+        for batch in group_media_files(category['files']):
             try:
-                send_func = {
-                    'document': context.bot.send_document,
-                    'photo': context.bot.send_photo,
-                    'video': context.bot.send_video,
-                    'audio': context.bot.send_audio
-                }.get(file['file_type'])
-                
-                if send_func:
-                    await send_func(
-                        chat_id=chat_id,
-                        **{file['file_type']: file['file_id']},
-                        caption=file.get('caption', '')[:1024]
-                    )
-                await asyncio.sleep(0.5)  # افزایش تاخیر برای جلوگیری از محدودیت
+                await send_file_batch(context, chat_id, batch)
             except Exception as e:
-                logger.error(f"ارسال فایل خطا: {e}")
-                await asyncio.sleep(2)
+                logger.error("ارسال فایل خطا: %s", e)
         
         # ارسال پیام پس از ارسال فایل‌ها
-        if category.get('post_message'):
+        if category['post_message']:
             await bot_manager.send_post_message(message, context, category['post_message'])
     except Exception as e:
-        logger.error(f"خطا در ارسال فایل‌ها: {e}")
+        logger.error("خطا در ارسال فایل‌ها: %s", e)
         await message.reply_text("❌ خطایی در ارسال فایل‌ها رخ داد")
 
 # ========================
@@ -670,25 +1289,25 @@ async def new_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(
         "لطفاً نام دسته جدید را وارد کنید:",
-        reply_markup=BACK_MENU
+        reply_markup=BACK_MENU_JSON
     )
     return AWAITING_CATEGORY_NAME
 
 async def save_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     name = update.message.text.strip()
-    if name == "↩️ بازگشت به منوی اصلی":
+    if name == BACK_BUTTON_TEXT:
         await cancel(update, context)
         return ConversationHandler.END
     
     user_id = update.effective_user.id
-    category_id = await bot_manager.db.add_category(name, user_id)
+    category_id = await bot_manager.add_category(name, user_id)
     link = bot_manager.generate_link(category_id)
     
-    await update.message.reply_text(
+    reply_in_background(update.message.reply_text(
         f"✅ دسته «{name}» با موفقیت ایجاد شد.\n\n"
         f"🔗 لینک دسته:\n{link}",
-        reply_markup=MAIN_MENU
-    )
+        reply_markup=MAIN_MENU_JSON
+    ))
     return ConversationHandler.END
 
 async def upload_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -699,17 +1318,18 @@ async def upload_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # نمایش دسته‌های موجود برای انتخاب
-    categories = await bot_manager.db.get_categories()
+    categories = await bot_manager.get_categories()
     if not categories:
         await update.message.reply_text("❌ هیچ دسته‌ای وجود ندارد! ابتدا یک دسته ایجاد کنید.")
         return
     
-    keyboard = []
-    for cid, name in categories.items():
-        keyboard.append([InlineKeyboardButton(
-            f"📁 {name} (ID: {cid})", 
-            callback_data=f"upload_cat_{cid}"
-        )])
+    keyboard = [
+        [InlineKeyboardButton(
+            f"📁 {category['name']} (ID: {category['id']})",
+            callback_data=f"upload_cat_{category['id']}"
+        )]
+        for category in categories
+    ]
     
     await update.message.reply_text(
         "لطفاً دسته مورد نظر را انتخاب کنید:",
@@ -730,7 +1350,8 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     upload = context.user_data['upload']
     upload['files'].append(file_info)
     
-    await update.message.reply_text(f"✅ فایل دریافت شد! (تعداد: {len(upload['files'])})")
+    # تایید دریافت، پردازش فایل بعدی را معطل نمی‌کند
+    reply_in_background(update.message.reply_text(f"✅ فایل دریافت شد! (تعداد: {len(upload['files'])})"))
 
 async def finish_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """پایان آپلود فایل‌ها"""
@@ -744,13 +1365,13 @@ async def finish_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ فایلی دریافت نشد!")
         return ConversationHandler.END
     
-    count = await bot_manager.db.add_files(upload['category_id'], upload['files'])
+    count = await bot_manager.add_files(upload['category_id'], upload['files'])
     link = bot_manager.generate_link(upload['category_id'])
     
     await update.message.reply_text(
         f"✅ {count} فایل با موفقیت ذخیره شد!\n\n"
         f"🔗 لینک دسته:\n{link}",
-        reply_markup=MAIN_MENU
+        reply_markup=MAIN_MENU_JSON
     )
     return ConversationHandler.END
 
@@ -760,17 +1381,20 @@ async def categories_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ دسترسی ممنوع!")
         return
     
-    categories = await bot_manager.db.get_categories()
+    categories = await bot_manager.get_categories()
     if not categories:
         await update.message.reply_text("📂 هیچ دسته‌ای وجود ندارد!")
         return
     
-    message = "📁 لیست دسته‌ها:\n\n"
-    for cid, name in categories.items():
-        message += f"• {name} [ID: {cid}]\n"
-        message += f"  لینک: {bot_manager.generate_link(cid)}\n\n"
+    parts = ["📁 لیست دسته‌ها:\n\n"]
+    parts.extend(
+        f"• {category['name']} [ID: {category['id']}]\n"
+        f"  📦 تعداد فایل‌ها: {category['file_count']}\n"
+        f"  لینک: {category['link']}\n\n"
+        for category in categories
+    )
     
-    await update.message.reply_text(message, reply_markup=MAIN_MENU)
+    await update.message.reply_text("".join(parts), reply_markup=MAIN_MENU_JSON)
 
 # ========================
 # === CHANNEL MANAGEMENT ==
@@ -782,27 +1406,24 @@ async def channel_management(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("❌ دسترسی ممنوع!")
         return
     
-    keyboard = [
-        [InlineKeyboardButton("➕ اضافه کردن کانال", callback_data="add_channel")],
-        [InlineKeyboardButton("➖ حذف کانال", callback_data="remove_channel")],
-        [InlineKeyboardButton("👁️ مشاهده کانال‌ها", callback_data="list_channels")]
-    ]
-    
     await update.message.reply_text(
         "مدیریت کانال‌های اجباری:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=CHANNEL_MANAGEMENT_MENU_JSON
     )
 
 async def start_add_channel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """شروع افزودن کانال"""
+    if update.callback_query:
+        await update.callback_query.answer()
+    message = update.effective_message
     if not await bot_manager.is_admin(update.effective_user.id):
-        await update.message.reply_text("❌ دسترسی ممنوع!")
-        return
+        await message.reply_text("❌ دسترسی ممنوع!")
+        return ConversationHandler.END
     
-    await update.message.reply_text(
+    await message.reply_text(
         "لطفا آیدی کانال را ارسال کنید (مثال: -1001234567890):\n\n"
         "⚠️ توجه: ربات باید ادمین کانال باشد!",
-        reply_markup=BACK_MENU
+        reply_markup=BACK_MENU_JSON
     )
     return WAITING_CHANNEL_INFO
 
@@ -811,11 +1432,11 @@ async def handle_channel_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     channel_id = update.message.text.strip()
     
     # اعتبارسنجی آیدی کانال
-    if not re.match(r'^-100\d+$', channel_id):
+    if not CHANNEL_ID_RE.match(channel_id):
         await update.message.reply_text(
             "❌ فرمت آیدی نامعتبر!\n"
             "لطفاً آیدی را به فرمت '-1001234567890' وارد کنید:",
-            reply_markup=BACK_MENU
+            reply_markup=BACK_MENU_JSON
         )
         return WAITING_CHANNEL_INFO
     
@@ -823,9 +1444,9 @@ async def handle_channel_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "✅ آیدی کانال معتبر است.\n\n"
         "لطفاً نام کانال را وارد کنید:",
-        reply_markup=BACK_MENU
+        reply_markup=BACK_MENU_JSON
     )
-    return WAITING_CHANNEL_INFO
+    return WAITING_CHANNEL_NAME
 
 async def handle_channel_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """پردازش نام کانال"""
@@ -834,44 +1455,44 @@ async def handle_channel_name(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.message.reply_text(
         "✅ نام کانال ذخیره شد.\n\n"
         "لطفاً لینک دعوت به کانال را وارد کنید:",
-        reply_markup=BACK_MENU
+        reply_markup=BACK_MENU_JSON
     )
-    return WAITING_CHANNEL_INFO
+    return WAITING_CHANNEL_LINK
 
 async def handle_channel_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """پردازش لینک دعوت و ذخیره نهایی"""
     link = update.message.text.strip()
     
     # اعتبارسنجی لینک دعوت
-    if not re.match(r'^https?://t\.me/[\w-]+(/[\w-]+)?$', link):
+    if not INVITE_LINK_RE.match(link):
         await update.message.reply_text(
             "❌ فرمت لینک نامعتبر!\n"
             "لطفاً لینک معتبر تلگرام وارد کنید (مثال: https://t.me/joinchat/ABC123):",
-            reply_markup=BACK_MENU
+            reply_markup=BACK_MENU_JSON
         )
-        return WAITING_CHANNEL_INFO
+        return WAITING_CHANNEL_LINK
     
     # ذخیره در دیتابیس
     channel_id = context.user_data['channel_id']
     name = context.user_data['channel_name']
     
     try:
-        success = await bot_manager.db.add_channel(channel_id, name, link)
+        success = await bot_manager.add_channel(channel_id, name, link)
         if success:
             await update.message.reply_text(
                 f"✅ کانال «{name}» با موفقیت افزوده شد!",
-                reply_markup=MAIN_MENU
+                reply_markup=MAIN_MENU_JSON
             )
         else:
             await update.message.reply_text(
                 "❌ خطا در افزودن کانال (احتمالاً تکراری است)!",
-                reply_markup=MAIN_MENU
+                reply_markup=MAIN_MENU_JSON
             )
     except Exception as e:
-        logger.error(f"Error adding channel: {e}")
+        logger.error("Error adding channel: %s", e)
         await update.message.reply_text(
             "❌ خطای سیستمی در افزودن کانال!",
-            reply_markup=MAIN_MENU
+            reply_markup=MAIN_MENU_JSON
         )
     
     # پاکسازی داده‌های موقت
@@ -883,23 +1504,23 @@ async def handle_channel_link(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def list_channels(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """نمایش لیست کانال‌ها"""
     if not await bot_manager.is_admin(update.effective_user.id):
-        await update.message.reply_text("❌ دسترسی ممنوع!")
+        await update.effective_message.reply_text("❌ دسترسی ممنوع!")
         return
     
-    channels = await bot_manager.db.get_channels()
+    channels = await bot_manager.get_channels()
     if not channels:
-        await update.message.reply_text("📢 هیچ کانالی ثبت نشده است!", reply_markup=MAIN_MENU)
+        await update.effective_message.reply_text("📢 هیچ کانالی ثبت نشده است!", reply_markup=MAIN_MENU_JSON)
         return
     
-    message = "📢 کانال‌های اجباری:\n\n"
-    for i, ch in enumerate(channels, 1):
-        message += (
-            f"{i}. {ch['channel_name']}\n"
-            f"   آیدی: {ch['channel_id']}\n"
-            f"   لینک: {ch['invite_link']}\n\n"
-        )
+    parts = ["📢 کانال‌های اجباری:\n\n"]
+    parts.extend(
+        f"{i}. {ch['channel_name']}\n"
+        f"   آیدی: {ch['channel_id']}\n"
+        f"   لینک: {ch['invite_link']}\n\n"
+        for i, ch in enumerate(channels, 1)
+    )
     
-    await update.message.reply_text(message, reply_markup=MAIN_MENU)
+    await update.effective_message.reply_text("".join(parts), reply_markup=MAIN_MENU_JSON)
 
 # ========================
 # ==== ADMIN MANAGEMENT ===
@@ -917,15 +1538,9 @@ async def admin_management(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ فقط سوپر ادمین‌ها می‌توانند ادمین‌ها را مدیریت کنند!")
         return
     
-    keyboard = [
-        [InlineKeyboardButton("➕ افزودن ادمین", callback_data="add_admin")],
-        [InlineKeyboardButton("➖ حذف ادمین", callback_data="remove_admin")],
-        [InlineKeyboardButton("👥 لیست ادمین‌ها", callback_data="list_admins")]
-    ]
-    
     await update.message.reply_text(
         "مدیریت ادمین‌ها:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=ADMIN_MANAGEMENT_MENU_JSON
     )
 
 async def list_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -938,12 +1553,14 @@ async def list_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("👤 هیچ ادمینی وجود ندارد!")
         return
     
-    message = "👥 لیست ادمین‌ها:\n\n"
-    for admin in admins:
-        message += f"• آیدی: {admin['user_id']}\n"
-        message += f"  سوپر ادمین: {'✅' if admin['is_super'] else '❌'}\n\n"
+    parts = ["👥 لیست ادمین‌ها:\n\n"]
+    parts.extend(
+        f"• آیدی: {admin['user_id']}\n"
+        f"  سوپر ادمین: {'✅' if admin['is_super'] else '❌'}\n\n"
+        for admin in admins
+    )
     
-    await query.edit_message_text(message)
+    await query.edit_message_text("".join(parts))
 
 async def start_add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """شروع افزودن ادمین جدید"""
@@ -952,7 +1569,7 @@ async def start_add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await query.edit_message_text(
         "لطفاً آیدی کاربر را وارد کنید:",
-        reply_markup=BACK_MENU
+        reply_markup=BACK_MENU_JSON
     )
     return AWAITING_ADMIN_ID
 
@@ -963,7 +1580,7 @@ async def start_remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     await query.edit_message_text(
         "لطفاً آیدی ادمین را وارد کنید:",
-        reply_markup=BACK_MENU
+        reply_markup=BACK_MENU_JSON
     )
     return AWAITING_ADMIN_ID
 
@@ -989,10 +1606,10 @@ async def handle_admin_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         if action == 'add_admin':
             # افزودن ادمین جدید (غیر سوپر)
-            await bot_manager.db.add_admin(admin_id, False, user_id)
+            await bot_manager.add_admin(admin_id, False, user_id)
             await update.message.reply_text(
                 f"✅ کاربر {admin_id} به عنوان ادمین افزوده شد.",
-                reply_markup=MAIN_MENU
+                reply_markup=MAIN_MENU_JSON
             )
         elif action == 'remove_admin':
             # حذف ادمین (به جز سوپر ادمین‌ها)
@@ -1000,10 +1617,10 @@ async def handle_admin_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await update.message.reply_text("❌ نمی‌توانید سوپر ادمین اصلی را حذف کنید!")
                 return ConversationHandler.END
                 
-            await bot_manager.db.remove_admin(admin_id)
+            await bot_manager.remove_admin(admin_id)
             await update.message.reply_text(
                 f"✅ ادمین {admin_id} با موفقیت حذف شد.",
-                reply_markup=MAIN_MENU
+                reply_markup=MAIN_MENU_JSON
             )
     
     return ConversationHandler.END
@@ -1023,18 +1640,9 @@ async def setup_post_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
     else:
         context.user_data['post_message'] = {'is_global': True}
     
-    keyboard = [
-        [InlineKeyboardButton("📝 متن", callback_data="post_text")],
-        [InlineKeyboardButton("🖼 عکس", callback_data="post_photo")],
-        [InlineKeyboardButton("🎥 ویدیو", callback_data="post_video")],
-        [InlineKeyboardButton("📄 سند", callback_data="post_document")],
-        [InlineKeyboardButton("🌐 پیام سراسری", callback_data="global_post")],
-        [InlineKeyboardButton("🗑 حذف پیام", callback_data="del_post")]
-    ]
-    
     await query.edit_message_text(
         "لطفاً نوع پیام پس از ارسال را انتخاب کنید:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=POST_MESSAGE_MENU_JSON
     )
     return POST_MESSAGE_SETUP
 
@@ -1049,12 +1657,7 @@ async def handle_post_message_type(update: Update, context: ContextTypes.DEFAULT
         await query.edit_message_text(
             "🌐 حالت تنظیم پیام سراسری فعال شد!\n\n"
             "لطفاً نوع پیام را انتخاب کنید:",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("📝 متن", callback_data="post_text")],
-                [InlineKeyboardButton("🖼 عکس", callback_data="post_photo")],
-                [InlineKeyboardButton("🎥 ویدیو", callback_data="post_video")],
-                [InlineKeyboardButton("📄 سند", callback_data="post_document")]
-            ])
+            reply_markup=POST_TYPE_MENU_JSON
         )
         return POST_MESSAGE_SETUP
     
@@ -1064,13 +1667,13 @@ async def handle_post_message_type(update: Update, context: ContextTypes.DEFAULT
             await bot_manager.db.delete_post_message(post_data['category_id'])
             await query.edit_message_text(
                 "✅ پیام پس از ارسال حذف شد!",
-                reply_markup=MAIN_MENU
+                reply_markup=MAIN_MENU_JSON
             )
         elif 'is_global' in post_data:
             await bot_manager.db.set_post_message(None, 'text', '', is_global=True)
             await query.edit_message_text(
                 "✅ پیام سراسری حذف شد!",
-                reply_markup=MAIN_MENU
+                reply_markup=MAIN_MENU_JSON
             )
         return ConversationHandler.END
     
@@ -1080,14 +1683,14 @@ async def handle_post_message_type(update: Update, context: ContextTypes.DEFAULT
     if msg_type == 'text':
         await query.edit_message_text(
             "لطفاً متن پیام را ارسال کنید:",
-            reply_markup=BACK_MENU
+            reply_markup=BACK_MENU_JSON
         )
         return AWAITING_POST_MESSAGE
     
     # برای مدیاها نیاز به ارسال فایل داریم
     await query.edit_message_text(
         f"لطفاً {'عکس' if msg_type == 'photo' else 'ویدیو' if msg_type == 'video' else 'سند'} را ارسال کنید:",
-        reply_markup=BACK_MENU
+        reply_markup=BACK_MENU_JSON
     )
     return AWAITING_POST_MESSAGE
 
@@ -1115,17 +1718,13 @@ async def save_post_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if is_global:
                 msg = "✅ متن پیام سراسری ذخیره شد!"
                 
-            await update.message.reply_text(msg, reply_markup=MAIN_MENU)
+            await update.message.reply_text(msg, reply_markup=MAIN_MENU_JSON)
         else:
             # استخراج فایل بر اساس نوع
-            if msg_type == 'photo':
-                file_id = update.message.photo[-1].file_id
-            elif msg_type == 'video':
-                file_id = update.message.video.file_id
-            elif msg_type == 'document':
-                file_id = update.message.document.file_id
-            else:
+            extractor = POST_FILE_ID_EXTRACTORS.get(msg_type)
+            if extractor is None:
                 raise ValueError("نوع پیام نامعتبر")
+            file_id = extractor(update.message)
             
             # ذخیره کپشن اگر وجود دارد
             caption = update.message.caption or ""
@@ -1138,16 +1737,17 @@ async def save_post_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 is_global=is_global
             )
             
-            msg = f"✅ {'عکس' if msg_type == 'photo' else 'ویدیو' if msg_type == 'video' else 'سند'} پیام پس از ارسال ذخیره شد!"
+            label = POST_MESSAGE_TYPE_LABELS[msg_type]
+            msg = f"✅ {label} پیام پس از ارسال ذخیره شد!"
             if is_global:
-                msg = f"✅ {'عکس' if msg_type == 'photo' else 'ویدیو' if msg_type == 'video' else 'سند'} پیام سراسری ذخیره شد!"
+                msg = f"✅ {label} پیام سراسری ذخیره شد!"
             
-            await update.message.reply_text(msg, reply_markup=MAIN_MENU)
+            await update.message.reply_text(msg, reply_markup=MAIN_MENU_JSON)
     except Exception as e:
-        logger.error(f"خطا در ذخیره پیام پس از ارسال: {e}")
+        logger.error("خطا در ذخیره پیام پس از ارسال: %s", e)
         await update.message.reply_text(
             "❌ خطا در ذخیره پیام! لطفاً مجدداً تلاش کنید.",
-            reply_markup=MAIN_MENU
+            reply_markup=MAIN_MENU_JSON
         )
     
     # پاکسازی داده‌های موقت
@@ -1164,7 +1764,7 @@ async def timer_management(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ دسترسی ممنوع!")
         return
     
-    settings = await bot_manager.db.get_timer_settings()
+    settings = await bot_manager.get_timer_settings()
     status = "فعال ✅" if settings and settings['is_active'] else "غیرفعال ❌"
     interval = settings['delete_after_seconds'] if settings else "تنظیم نشده"
     message = settings['post_delete_message'] if settings else "تنظیم نشده"
@@ -1188,10 +1788,10 @@ async def toggle_timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    settings = await bot_manager.db.get_timer_settings()
+    settings = await bot_manager.get_timer_settings()
     new_status = not settings['is_active'] if settings else True
     
-    await bot_manager.db.update_timer_settings(new_status)
+    await bot_manager.update_timer_settings(new_status)
     
     # به‌روزرسانی پیام با وضعیت جدید
     status = "فعال ✅" if new_status else "غیرفعال ❌"
@@ -1221,7 +1821,7 @@ async def set_timer_interval(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.edit_message_text(
         "لطفاً زمان جدید برای حذف خودکار فایل‌ها را به ثانیه وارد کنید:\n\n"
         "مثال: 3600 (برای 1 ساعت)",
-        reply_markup=BACK_MENU
+        reply_markup=BACK_MENU_JSON
     )
     return TIMER_SETTINGS
 
@@ -1232,16 +1832,16 @@ async def save_timer_interval(update: Update, context: ContextTypes.DEFAULT_TYPE
         if seconds < 60:
             raise ValueError("زمان باید حداقل 60 ثانیه باشد")
             
-        await bot_manager.db.update_timer_settings(None, seconds)
+        await bot_manager.update_timer_settings(None, seconds)
         await update.message.reply_text(
             f"✅ زمان تایمر به {seconds} ثانیه تنظیم شد",
-            reply_markup=MAIN_MENU
+            reply_markup=MAIN_MENU_JSON
         )
         return ConversationHandler.END
     except ValueError as e:
         await update.message.reply_text(
             f"❌ خطا: {str(e)}\nلطفاً عدد معتبر وارد کنید:",
-            reply_markup=BACK_MENU
+            reply_markup=BACK_MENU_JSON
         )
         return TIMER_SETTINGS
 
@@ -1252,59 +1852,149 @@ async def save_timer_interval(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """لغو عملیات جاری"""
     # پاکسازی داده‌های موقت
-    context.user_data.pop('upload', None)
-    context.user_data.pop('channel_id', None)
-    context.user_data.pop('channel_name', None)
-    context.user_data.pop('post_message', None)
-    context.user_data.pop('admin_action', None)
+    user_data = context.user_data
+    for key in TEMP_USER_DATA_KEYS:
+        user_data.pop(key, None)
     
-    await update.message.reply_text("❌ عملیات لغو شد.", reply_markup=MAIN_MENU)
+    await update.message.reply_text("❌ عملیات لغو شد.", reply_markup=MAIN_MENU_JSON)
     return ConversationHandler.END
 
+async def check_membership_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, category_id: str):
+    """بررسی مجدد عضویت پس از کلیک روی «عضو شدم»"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    
+    # بررسی مجدد عضویت
+    channels = await bot_manager.get_channels()
+    non_joined = await bot_manager.get_non_joined_channels(user_id, channels, context)
+    
+    if non_joined:
+        # هنوز در برخی کانال‌ها عضو نیست
+        await query.edit_message_text(
+            "⚠️ هنوز در کانال‌های زیر عضو نشده‌اید:",
+            reply_markup=join_channels_keyboard(non_joined, category_id))
+    else:
+        # حالا عضو شده است
+        await query.edit_message_text("✅ عضویت شما تأیید شد! در حال آماده‌سازی فایل‌ها...")
+        await send_category_files(query.message, context, category_id)
+
+async def view_category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, category_id: str):
+    """نمایش فایل‌های دسته برای ادمین"""
+    await send_category_files(update.callback_query.message, context, category_id)
+
+async def add_files_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, category_id: str):
+    """شروع افزودن فایل به دسته"""
+    context.user_data['upload'] = {
+        'category_id': category_id,
+        'files': []
+    }
+    await update.callback_query.edit_message_text(
+        "📤 فایل‌ها را ارسال کنید.\n"
+        "برای پایان: /finish_upload\n"
+        "برای لغو: /cancel"
+    )
+    return UPLOADING
+
+async def delete_category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, category_id: str):
+    """حذف دسته"""
+    query = update.callback_query
+    success = await bot_manager.delete_category(category_id)
+    if success:
+        await query.edit_message_text("✅ دسته با موفقیت حذف شد!")
+    else:
+        await query.edit_message_text("❌ خطا در حذف دسته!")
+
+async def post_message_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, category_id: str):
+    """تنظیم پیام پس از ارسال دسته"""
+    return await setup_post_message(update, context)
+
+async def delete_channel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, channel_id: str):
+    """حذف کانال اجباری"""
+    query = update.callback_query
+    success = await bot_manager.delete_channel(channel_id)
+    if success:
+        await query.edit_message_text("✅ کانال با موفقیت حذف شد!")
+    else:
+        await query.edit_message_text("❌ خطا در حذف کانال!")
+
+async def remove_channel_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """نمایش لیست کانال‌ها برای حذف"""
+    query = update.callback_query
+    channels = await bot_manager.get_channels()
+    if not channels:
+        await query.edit_message_text("📢 هیچ کانالی ثبت نشده است!")
+        return
+    
+    keyboard = [
+        [InlineKeyboardButton(
+            f"❌ {channel['channel_name']}",
+            callback_data=f"delchan_{channel['channel_id']}"
+        )]
+        for channel in channels
+    ]
+    
+    await query.edit_message_text(
+        "کانال مورد نظر برای حذف را انتخاب کنید:",
+        reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def add_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """شروع افزودن ادمین از دکمه"""
+    context.user_data['admin_action'] = 'add_admin'
+    return await start_add_admin(update, context)
+
+async def remove_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """شروع حذف ادمین از دکمه"""
+    context.user_data['admin_action'] = 'remove_admin'
+    return await start_remove_admin(update, context)
+
+async def edit_timer_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """درخواست پیام جدید تایمر"""
+    await update.callback_query.edit_message_text(
+        "لطفاً پیام جدید برای تایمر را وارد کنید:",
+        reply_markup=BACK_MENU_JSON
+    )
+    return TIMER_SETTINGS
+
+# دکمه‌هایی که callback_data آن‌ها دقیقاً برابر کلید است
+CALLBACK_ACTIONS = {
+    'post_text': handle_post_message_type,
+    'post_photo': handle_post_message_type,
+    'post_video': handle_post_message_type,
+    'post_document': handle_post_message_type,
+    'global_post': handle_post_message_type,
+    'del_post': handle_post_message_type,
+    # مدیریت کانال‌ها (add_channel ورودی گفتگوی کانال‌هاست و allow_reentry دارد)
+    'remove_channel': remove_channel_menu,
+    'list_channels': list_channels,
+    # مدیریت ادمین‌ها
+    'add_admin': add_admin_callback,
+    'remove_admin': remove_admin_callback,
+    'list_admins': list_admins,
+    # مدیریت تایمر
+    'toggle_timer': toggle_timer,
+    'set_timer_interval': set_timer_interval,
+    'edit_timer_message': edit_timer_message,
+}
+
+# دکمه‌هایی به شکل «پیشوند_آرگومان»
+CALLBACK_PREFIX_HANDLERS = {
+    'view': view_category_callback,
+    'add': add_files_callback,
+    'delcat': delete_category_callback,
+    'postmsg': post_message_callback,
+    'delchan': delete_channel_callback,
+}
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """مدیریت کلیک روی دکمه‌ها"""
     query = update.callback_query
     await query.answer()
     data = query.data
+    prefix, _, arg = data.partition('_')
     
-    # بررسی عضویت در کانال‌ها
-    if data.startswith('check_'):
-        category_id = data[6:]
-        user_id = query.from_user.id
-        
-        # بررسی مجدد عضویت
-        channels = await bot_manager.db.get_channels()
-        non_joined = []
-        for channel in channels:
-            is_member = await bot_manager.check_channel_membership(user_id, channel['channel_id'], context)
-            if not is_member:
-                non_joined.append(channel)
-        
-        if non_joined:
-            # هنوز در برخی کانال‌ها عضو نیست
-            keyboard = []
-            for channel in non_joined:
-                button = InlineKeyboardButton(
-                    text=f"📢 {channel['channel_name']}",
-                    url=channel['invite_link']
-                )
-                keyboard.append([button])
-            
-            keyboard.append([
-                InlineKeyboardButton(
-                    "✅ عضو شدم", 
-                    callback_data=f"check_{category_id}"
-                )
-            ])
-            
-            await query.edit_message_text(
-                "⚠️ هنوز در کانال‌های زیر عضو نشده‌اید:",
-                reply_markup=InlineKeyboardMarkup(keyboard))
-        else:
-            # حالا عضو شده است
-            await query.edit_message_text("✅ عضویت شما تأیید شد! در حال آماده‌سازی فایل‌ها...")
-            await send_category_files(query.message, context, category_id)
-        return
+    # بررسی عضویت در کانال‌ها (برای همه کاربران)
+    if prefix == 'check':
+        return await check_membership_callback(update, context, arg)
     
     # دستورات ادمین
     user_id = query.from_user.id
@@ -1312,96 +2002,26 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("❌ دسترسی ممنوع!")
         return
     
-    if data.startswith('view_'):
-        category_id = data[5:]
-        await send_category_files(query.message, context, category_id)
+    # ابتدا تطابق کامل، سپس پیشوند (تا مثلاً add_channel با add_ اشتباه نشود)
+    action = CALLBACK_ACTIONS.get(data)
+    if action:
+        return await action(update, context)
     
-    elif data.startswith('add_'):
-        category_id = data[4:]
-        context.user_data['upload'] = {
-            'category_id': category_id,
-            'files': []
-        }
-        await query.edit_message_text(
-            "📤 فایل‌ها را ارسال کنید.\n"
-            "برای پایان: /finish_upload\n"
-            "برای لغو: /cancel"
-        )
-        return UPLOADING
-    
-    elif data.startswith('delcat_'):
-        category_id = data[7:]
-        success = await bot_manager.db.delete_category(category_id)
-        if success:
-            await query.edit_message_text("✅ دسته با موفقیت حذف شد!")
-        else:
-            await query.edit_message_text("❌ خطا در حذف دسته!")
-    
-    elif data.startswith('postmsg_'):
-        await setup_post_message(update, context)
-    
-    elif data in ['post_text', 'post_photo', 'post_video', 'post_document', 'global_post', 'del_post']:
-        await handle_post_message_type(update, context)
-    
-    # مدیریت کانال‌ها
-    elif data == "add_channel":
-        await start_add_channel(update, context)
-    
-    elif data == "remove_channel":
-        channels = await bot_manager.db.get_channels()
-        if not channels:
-            await query.edit_message_text("📢 هیچ کانالی ثبت نشده است!")
-            return
-        
-        keyboard = []
-        for channel in channels:
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"❌ {channel['channel_name']}",
-                    callback_data=f"delchan_{channel['channel_id']}"
-                )
-            ])
-        
-        await query.edit_message_text(
-            "کانال مورد نظر برای حذف را انتخاب کنید:",
-            reply_markup=InlineKeyboardMarkup(keyboard))
-    
-    elif data == "list_channels":
-        await list_channels(query.message)
-    
-    elif data.startswith('delchan_'):
-        channel_id = data[8:]
-        success = await bot_manager.db.delete_channel(channel_id)
-        if success:
-            await query.edit_message_text("✅ کانال با موفقیت حذف شد!")
-        else:
-            await query.edit_message_text("❌ خطا در حذف کانال!")
-    
-    # مدیریت ادمین‌ها
-    elif data == "add_admin":
-        context.user_data['admin_action'] = 'add_admin'
-        await start_add_admin(update, context)
-    
-    elif data == "remove_admin":
-        context.user_data['admin_action'] = 'remove_admin'
-        await start_remove_admin(update, context)
-    
-    elif data == "list_admins":
-        await list_admins(update, context)
-    
-    # مدیریت تایمر
-    elif data == "toggle_timer":
-        await toggle_timer(update, context)
-    
-    elif data == "set_timer_interval":
-        await set_timer_interval(update, context)
-    
-    elif data == "edit_timer_message":
-        await query.edit_message_text(
-            "لطفاً پیام جدید برای تایمر را وارد کنید:",
-            reply_markup=BACK_MENU
-        )
-        return TIMER_SETTINGS
+    handler = CALLBACK_PREFIX_HANDLERS.get(prefix)
+    if handler:
+        return await handler(update, context, arg)
+
+# دکمه‌های منوی اصلی بدون حالت گفتگو
+MENU_HANDLERS = {
+    "📂 نمایش دسته‌ها": categories_list,
+    "👤 مدیریت ادمین‌ها": admin_management,
+}
+
+async def menu_dispatcher(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """ارسال دکمه منو به هندلر مربوطه"""
+    handler = MENU_HANDLERS.get(update.message.text)
+    if handler:
+        return await handler(update, context)
 
 # ========================
 # === WEB SERVER SETUP ===
@@ -1411,39 +2031,97 @@ async def health_check(request):
     """صفحه سلامت برای بررسی وضعیت ربات"""
     return web.Response(text="🤖 Telegram Bot is Running!")
 
-async def keep_alive():
+def create_http_session() -> aiohttp.ClientSession:
+    """نشست HTTP مشترک برای درخواست‌های خروجی سرور وب"""
+    # مهلت keep-alive پیش‌فرض (15 ثانیه) از فاصله پینگ‌ها کوتاه‌تر است
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        ttl_dns_cache=300,
+        keepalive_timeout=KEEP_ALIVE_INTERVAL + 60
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=15))
+
+async def close_http_session(app: web.Application):
+    """بستن نشست HTTP مشترک هنگام توقف سرور"""
+    await app['http_session'].close()
+
+async def keep_alive(session: aiohttp.ClientSession):
     """ارسال درخواست به health endpoint هر 5 دقیقه"""
+    # نشست مشترک تا اتصال TCP/TLS بین پینگ‌ها دوباره استفاده شود
     while True:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(WEBHOOK_URL + "/health") as resp:
-                    if resp.status == 200:
-                        logger.info("✅ Keep-alive ping sent successfully")
-                    else:
-                        logger.warning(f"⚠️ Keep-alive failed: {resp.status}")
+            async with session.get(WEBHOOK_URL + "/health") as resp:
+                if resp.status == 200:
+                    logger.info("✅ Keep-alive ping sent successfully")
+                else:
+                    logger.warning("⚠️ Keep-alive failed: %s", resp.status)
         except Exception as e:
-            logger.warning(f"⚠️ Keep-alive exception: {e}")
+            logger.warning("⚠️ Keep-alive exception: %s", e)
         
-        await asyncio.sleep(300)  # هر 5 دقیقه
+        await asyncio.sleep(KEEP_ALIVE_INTERVAL)
 
 async def webhook_handler(request):
     """مدیریت درخواست‌های Webhook"""
     application = request.app['bot_application']
-    data = await request.json()
+    data = await request.json(loads=json_loads)
     update = Update.de_json(data, application.bot)
-    await application.process_update(update)
+    # پردازش در پس‌زمینه؛ پاسخ فوری به تلگرام
+    # (آپدیت‌های هر چت همیشه به یک صف می‌روند تا ترتیبشان حفظ شود؛
+    # با پر شدن صف، پاسخ به تلگرام تا آزاد شدن ظرفیت به تعویق می‌افتد)
+    queues = request.app['update_queues']
+    await queues[update_shard_key(update) % len(queues)].put(update)
     return web.Response()
 
+def update_shard_key(update: Update) -> int:
+    """کلید تقسیم آپدیت‌ها بین صف‌ها (چت، کاربر یا شناسه آپدیت)"""
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return update.update_id
+
+async def update_worker(application: Application, queue: asyncio.Queue):
+    """پردازش آپدیت‌های صف Webhook در پس‌زمینه"""
+    while True:
+        update = await queue.get()
+        try:
+            await application.process_update(update)
+            release_idle_data(application, update)
+        except Exception:
+            logger.exception("خطا در پردازش آپدیت")
+        finally:
+            queue.task_done()
+
+def release_idle_data(application: Application, update: Update):
+    """حذف user_data/chat_data خالی تا حافظه با تعداد کاربران رشد نکند"""
+    user = update.effective_user
+    if user and user.id in application.user_data and not application.user_data[user.id]:
+        application.drop_user_data(user.id)
+    chat = update.effective_chat
+    if chat and chat.id in application.chat_data and not application.chat_data[chat.id]:
+        application.drop_chat_data(chat.id)
+
 async def setup_bot():
     """تنظیم و اجرای ربات با Webhook"""
     # ایجاد برنامه تلگرام
-    application = Application.builder().token(BOT_TOKEN).updater(None).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .updater(None)
+        .request(HTTPXRequest(
+            connection_pool_size=BOT_API_POOL_SIZE,
+            http_version=BOT_API_HTTP_VERSION,
+            pool_timeout=5
+        ))
+        .rate_limiter(BotRateLimiter(max_retries=2))
+        .build()
+    )
     
     # دریافت یوزرنیم ربات
     await application.initialize()
     bot = await application.bot.get_me()
     bot_username = bot.username
-    logger.info(f"Bot username: @{bot_username}")
+    logger.info("Bot username: @%s", bot_username)
     await bot_manager.init(bot_username)
     
     # دستورات اصلی
@@ -1454,7 +2132,7 @@ async def setup_bot():
     # مدیریت دسته‌ها
     category_handler = ConversationHandler(
         entry_points=[
-            MessageHandler(filters.Regex("^📁 ساخت دسته جدید$"), new_category),
+            MessageHandler(filters.Text(["📁 ساخت دسته جدید"]), new_category),
             CallbackQueryHandler(new_category, pattern="^new_category$")
         ],
         states={
@@ -1464,12 +2142,13 @@ async def setup_bot():
     )
     application.add_handler(category_handler)
     
-    application.add_handler(MessageHandler(filters.Regex("^📂 نمایش دسته‌ها$"), categories_list))
+    # دکمه‌های منوی اصلی که وارد گفتگو نمی‌شوند (یک هندلر با جستجوی دیکشنری)
+    application.add_handler(MessageHandler(filters.Text(list(MENU_HANDLERS)), menu_dispatcher))
     
     # آپلود فایل‌ها
     upload_handler = ConversationHandler(
         entry_points=[
-            MessageHandler(filters.Regex("^📤 آپلود فایل$"), upload_command),
+            MessageHandler(filters.Text(["📤 آپلود فایل"]), upload_command),
             CallbackQueryHandler(lambda u, c: upload_command(u, c), pattern="^upload_cat_")
         ],
         states={
@@ -1488,7 +2167,7 @@ async def setup_bot():
     # تایمر خودکار
     timer_handler = ConversationHandler(
         entry_points=[
-            MessageHandler(filters.Regex("^⏱ تایمر خودکار$"), timer_management),
+            MessageHandler(filters.Text(["⏱ تایمر خودکار"]), timer_management),
             CallbackQueryHandler(timer_management, pattern="^timer_management$")
         ],
         states={
@@ -1502,25 +2181,30 @@ async def setup_bot():
     application.add_handler(timer_handler)
     
     # مدیریت کانال‌ها
+    # هر مرحله حالت مستقل خود را دارد تا فقط هندلر همان مرحله اجرا شود
+    channel_input = filters.TEXT & ~filters.COMMAND & ~filters.Text([BACK_BUTTON_TEXT])
     channel_handler = ConversationHandler(
         entry_points=[
-            MessageHandler(filters.Regex("^📢 تنظیم کانال اجباری$"), channel_management),
-            CallbackQueryHandler(channel_management, pattern="^channel_management$")
+            MessageHandler(filters.Text(["📢 تنظیم کانال اجباری"]), channel_management),
+            CallbackQueryHandler(channel_management, pattern="^channel_management$"),
+            CallbackQueryHandler(start_add_channel, pattern="^add_channel$")
         ],
         states={
-            WAITING_CHANNEL_INFO: [
-                MessageHandler(filters.TEXT, handle_channel_id),
-                MessageHandler(filters.TEXT, handle_channel_name),
-                MessageHandler(filters.TEXT, handle_channel_link)
-            ]
+            WAITING_CHANNEL_INFO: [MessageHandler(channel_input, handle_channel_id)],
+            WAITING_CHANNEL_NAME: [MessageHandler(channel_input, handle_channel_name)],
+            WAITING_CHANNEL_LINK: [MessageHandler(channel_input, handle_channel_link)]
         },
-        fallbacks=[CommandHandler("cancel", cancel)]
+        fallbacks=[
+            CommandHandler("cancel", cancel),
+            MessageHandler(filters.Text([BACK_BUTTON_TEXT]), cancel)
+        ],
+        # زدن دوباره «اضافه کردن کانال» در میانه گفتگو، آن را از ابتدا شروع می‌کند
+        # (در غیر این صورت به button_handler و پیشوند add_ دسته‌ها می‌رسد)
+        allow_reentry=True
     )
     application.add_handler(channel_handler)
     
     # مدیریت ادمین‌ها
-    application.add_handler(MessageHandler(filters.Regex("^👤 مدیریت ادمین‌ها$"), admin_management))
-    
     admin_id_handler = ConversationHandler(
         entry_points=[
             CallbackQueryHandler(start_add_admin, pattern="^add_admin$"),
@@ -1564,30 +2248,61 @@ async def run_web_server():
     app.router.add_get('/health', health_check)
     app.router.add_post(WEBHOOK_PATH, webhook_handler)
     
+    # نشست HTTP مشترک برای همه درخواست‌های خروجی غیر از Bot API
+    app['http_session'] = create_http_session()
+    app.on_cleanup.append(close_http_session)
+    
     # تنظیم ربات
     application = await setup_bot()
     app['bot_application'] = application
     
+    # یک صف محدود برای هر پردازشگر پس‌زمینه
+    update_queues = [asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE) for _ in range(UPDATE_WORKERS)]
+    app['update_queues'] = update_queues
+    app['update_workers'] = [
+        asyncio.create_task(update_worker(application, queue))
+        for queue in update_queues
+    ]
+    
     # تنظیم Webhook
     await application.bot.set_webhook(
         url=WEBHOOK_URL + WEBHOOK_PATH,
         drop_pending_updates=True
     )
-    logger.info(f"Webhook set to: {WEBHOOK_URL}{WEBHOOK_PATH}")
+    logger.info("Webhook set to: %s%s", WEBHOOK_URL, WEBHOOK_PATH)
     
     # اجرای وظیفه keep_alive در پس‌زمینه
-    asyncio.create_task(keep_alive())
+    keep_alive_task = asyncio.create_task(keep_alive(app['http_session']))
     
     # اجرای سرور
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', PORT)
     await site.start()
-    logger.info(f"Web server started at port {PORT}")
+    logger.info("Web server started at port %s", PORT)
     
-    # نگه داشتن برنامه در حال اجرا
-    while True:
-        await asyncio.sleep(3600)
+    # نگه داشتن برنامه در حال اجرا تا دریافت سیگنال توقف
+    shutdown = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, shutdown.set)
+        except NotImplementedError:  # ویندوز از add_signal_handler پشتیبانی نمی‌کند
+            break
+    await shutdown.wait()
+    
+    # توقف مرتب: قطع دریافت Webhook، پردازش آپدیت‌های باقی‌مانده و بستن ربات
+    logger.info("Shutting down...")
+    keep_alive_task.cancel()  # پیش از بسته شدن نشست HTTP مشترک
+    await runner.cleanup()
+    for queue in update_queues:
+        await queue.join()
+    for task in app['update_workers']:
+        task.cancel()
+    # ارسال پیام‌های تایید در جریان پیش از بستن ربات تمام می‌شود
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    await application.shutdown()
+    await bot_manager.db.close()
 
 async def main():
     """اجرای اصلی برنامه"""
@@ -1595,8 +2310,12 @@ async def main():
 
 if __name__ == '__main__':
     try:
-        asyncio.run(main())
+        # حلقه رویداد uvloop در صورت نصب بودن، در غیر این صورت asyncio استاندارد
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
-    except Exception as e:
-        logger.exception(f"Critical error: {e}")
\ No newline at end of file
+    except Exception:
+        logger.exception("Critical error")
\ No newline at end of file